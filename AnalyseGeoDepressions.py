@@ -13,7 +13,7 @@ try:
     import arcpy
     import sys
     import traceback
-    import math
+    import numpy as np
     import os
 
     # Custom exceptions for spatial analysis license and bath with negative values only
@@ -24,19 +24,15 @@ try:
         pass
 
     # Azimuth function
-    def azimuth(coords):
+    def azimuth(x1, x2, y1, y2):
         """
         Return azimuthal bearing relative to north
 
         Keyword arguments:
-        coords -- list of coordinates x1, x2, y1, y2
+        x1, x2, y1, y2 -- coordinate arrays of line start and end points
         """
 
-        radians = math.atan2((coords[1] - coords[0]), (coords[3] - coords[2]))
-        degrees = (radians * 180) / math.pi
-        if degrees < 0:
-            degrees += 180
-        return degrees
+        return np.degrees(np.arctan2((x2 - x1), (y2 - y1))) % 180
 
     # Eccentricity function
     def eccentricity(major_axis, minor_axis):
@@ -44,51 +40,75 @@ try:
         Returns eccentricity of 2 axis
 
         Keyword arguments:
-        major_axis -- major axis of shape (int or float)
-        minor_axis -- minor axis of shape (int of float)
+        major_axis -- major axis of shapes (float array)
+        minor_axis -- minor axis of shapes (float array)
         """
 
-        return math.sqrt(((float(major_axis) ** 2) - (float(minor_axis) ** 2)) / (float(major_axis) ** 2))
+        return np.sqrt(((major_axis ** 2) - (minor_axis ** 2)) / (major_axis ** 2))
 
     # Thinness ratio function
     def thinness_ratio(area, perimeter):
         """
-        Returns the thinness ratio, given area and perimeter of shape
+        Returns the thinness ratio, given area and perimeter of shapes
 
         Keyword arguments:
-        area      -- area of shape
-        perimeter -- perimeter of shape
+        area      -- area of shapes (float array)
+        perimeter -- perimeter of shapes (float array)
         """
 
-        return (4 * math.pi) * (area / (perimeter ** 2))
+        return (4 * np.pi) * (area / (perimeter ** 2))
+
+    # Morphological feature descriptions, indexed by shape_descriptor
+    shape_descriptions = ("Irregular shape and/or low dia/dep ratio. Unlikely to be caused by fluid escape",
+                          "Semi-regular shape. Depression needs further investigation",
+                          "Regular shape. Potentially a geo-feature caused by fluid escape")
 
     # Morphological feature descriptor
     def shape_descriptor(poly_thinness, poly_dd_ratio):
         """
-        Returns generic description of polygon shape
+        Returns index into shape_descriptions of generic description of polygon shapes
 
         Keyword arguments:
-        poly_thinness       -- thinness ratio of polygon
-        poly_dd_ratio       -- diameter/depth ratio of polygon
+        poly_thinness       -- thinness ratio of polygons (float array)
+        poly_dd_ratio       -- diameter/depth ratio of polygons (float array)
         """
 
-        if poly_thinness < 0.5 or poly_dd_ratio > 100:
-            return "Irregular shape and/or low dia/dep ratio. Unlikely to be caused by fluid escape"
-        elif poly_thinness < 0.75:
-            return "Semi-regular shape. Depression needs further investigation"
-        else:
-            return "Regular shape. Potentially a geo-feature caused by fluid escape"
+        return np.where((poly_thinness < 0.5) | (poly_dd_ratio > 100), 0, np.where(poly_thinness < 0.75, 1, 2))
 
     def diameter_depth_ratio(diameter, depth):
         """
         Returns depth:diameter ratio
 
         Keyword arguments:
-        diameter   -- average diamater of polygon
-        depth      -- depth of polygon
+        diameter   -- average diamater of polygons (float array)
+        depth      -- depth of polygons (float array)
+        """
+
+        return np.abs(diameter / depth)
+
+    # Polygon metrics function
+    def polygon_metrics(hull, area, perimeter, depth):
+        """
+        Returns major axis, minor axis, eccentricity, azimuth, thinness ratio and diameter/depth ratio arrays
+
+        Keyword arguments:
+        hull      -- (N, 8) array of hull rectangle coordinates x1, y1, x2, y2, x3, y3, x4, y4
+        area      -- area of polygons (float array)
+        perimeter -- perimeter of polygons (float array)
+        depth     -- depth of polygons (float array)
         """
 
-        return abs(diameter/depth)
+        x1, y1, x2, y2, x3, y3 = hull[:, :6].T
+        distance1 = np.hypot((x1 - x2), (y1 - y2))
+        distance2 = np.hypot((x2 - x3), (y2 - y3))
+        short_first = distance1 <= distance2
+        min_axis = np.where(short_first, distance1, distance2)
+        maj_axis = np.where(short_first, distance2, distance1)
+        bearing = azimuth(np.where(short_first, x2, x1), np.where(short_first, x3, x2),
+                          np.where(short_first, y2, y1), np.where(short_first, y3, y2))
+
+        return (maj_axis, min_axis, eccentricity(maj_axis, min_axis), bearing, thinness_ratio(area, perimeter),
+                diameter_depth_ratio((maj_axis + min_axis) / 2, depth))
 
     # arcpy environment settings
     arcpy.env.workspace = r"in_memory"
@@ -105,14 +125,12 @@ try:
     describe = arcpy.Describe(raster_layer)
     raster_source = os.path.join(describe.path, os.path.basename(raster_layer))
     bathy_dataset = arcpy.Raster(raster_source)
+    cell_size = bathy_dataset.meanCellWidth
     maximum_value = bathy_dataset.maximum
     arcpy.AddMessage("Bathy statistics calculated.")
     if float(maximum_value) > 0:
         raise NotNegative
 
-    if float(maximum_value) > 0:
-        raise NotNegative
-
     # Check out Spatial Analyst extension if available
     if arcpy.CheckExtension("spatial") == "Available":
         arcpy.CheckOutExtension("spatial")
@@ -125,66 +143,63 @@ try:
     # Use 32 bit epsilon value to avoid float numbers issues
     zonal_min = arcpy.sa.ZonalStatistics(depression_polygons, "FID", bathy_dataset, statistics_type="MINIMUM",
                                          ignore_nodata="DATA")
-    zonal_max = arcpy.sa.ZonalStatistics(depression_polygons, "FID", bathy_dataset, statistics_type="MAXIMUM",
-                                         ignore_nodata="DATA")
-    depression_depth = arcpy.sa.Con((abs((abs(zonal_max - bathy_dataset))-(abs(zonal_max - zonal_min)))) < 0.001,
-                                    (abs(zonal_max - zonal_min)))
-    deepest_point = arcpy.RasterToPoint_conversion(depression_depth, None, "VALUE")
+    deepest_cells = arcpy.sa.Con(arcpy.sa.Abs(bathy_dataset - zonal_min) < 0.001, zonal_min)
+    deepest_point = arcpy.RasterToPoint_conversion(deepest_cells, None, "VALUE")
     arcpy.AddMessage("Deepest point located.")
 
-    # Extract bathymetry depth value to deepest point
-    arcpy.sa.ExtractMultiValuesToPoints(deepest_point, [[bathy_dataset, "DEPTH"]], "NONE")
-
-    # Add fields to depression polygons for calculations
-    float_fields = ["MAJ_AXIS", "MIN_AXIS", "ECC", "AZIMUTH", "THIN_RAT", "PERIMETER", "AREA_M", "DIDP_RAT"]
-    for field in float_fields:
-        arcpy.AddField_management(depression_polygons, field, "FLOAT")
-    # Add morphological characteristics and azimuth field.
-    arcpy.AddField_management(depression_polygons, "MORP_CHAR", "TEXT", field_length=80)
-    arcpy.AddField_management(depression_polygons, "DEP_ID", "SHORT")
+    # Deepest point value is already the bathymetry depth of the deepest cell
+    arcpy.AlterField_management(deepest_point, "grid_code", "DEPTH", "DEPTH")
 
     # Smooth depression polygons
-    describe = arcpy.Describe(bathy_dataset)
-    cell_size = describe.meanCellWidth
-    min_area = (cell_size * 2) ** 2
     tolerance = cell_size * 3
     depression_polygons = arcpy.SmoothPolygon_cartography(depression_polygons, None, "PAEK", tolerance, "NO_FIXED")
     arcpy.AddMessage("Polygons smoothed.")
 
-    # Calculate major axis, minor axis, azimuth, and eccentricity fields
-    with arcpy.da.UpdateCursor(depression_polygons, ["SHAPE@", "DEP_ID", "AREA_M", "PERIMETER", "MAJ_AXIS", "MIN_AXIS",
-                                                     "ECC", "AZIMUTH", "THIN_RAT", "MORP_CHAR", "DIDP_RAT",
-                                                     "POCK_DEP"]) as cursor:
-        dep_id = 1
-        for row in cursor:
-            shape_object = row[0]
-            row[1] = dep_id
-            row[2] = shape_object.area
-            row[3] = shape_object.length
-            x1, y1, x2, y2, x3, y3, x4, y4 = [float(coord) for coord in shape_object.hullRectangle.split(" ")]
-            distance1 = math.hypot((x1 - x2), (y1 - y2))
-            distance2 = math.hypot((x2 - x3), (y2 - y3))
-            if distance1 <= distance2:
-                min_axis = distance1
-                maj_axis = distance2
-                azimuth_coords = [x2, x3, y2, y3]
-            else:
-                min_axis = distance2
-                maj_axis = distance1
-                azimuth_coords = [x1, x2, y1, y2]
-
-            row[4] = maj_axis
-            row[5] = min_axis
-            row[6] = eccentricity(maj_axis, min_axis)
-            row[7] = azimuth(azimuth_coords)
-            row[8] = thinness_ratio(row[2], row[3])
-            average_diameter = (row[4] + row[5]) / 2
-            row[10] = diameter_depth_ratio(average_diameter, row[11])
-            row[9] = shape_descriptor(row[8], row[10])
-            cursor.updateRow(row)
-            dep_id += 1
+    # Read geometry and depth of every polygon in a single pass
+    oids, areas, perimeters, depths, hulls = [], [], [], [], []
+    with arcpy.da.SearchCursor(depression_polygons, ["OID@", "SHAPE@AREA", "SHAPE@LENGTH", "POCK_DEP",
+                                                     "SHAPE@"]) as cursor:
+        for oid, shape_area, shape_length, depth, shape_object in cursor:
+            oids.append(oid)
+            areas.append(shape_area)
+            perimeters.append(shape_length)
+            depths.append(depth)
+            hulls.append(shape_object.hullRectangle)
         del cursor
 
+    area = np.array(areas, dtype=float)
+    perimeter = np.array(perimeters, dtype=float)
+    depth = np.array(depths, dtype=float)
+    hull = np.fromstring(" ".join(hulls), dtype=float, sep=" ").reshape(-1, 8)
+
+    # Calculate major axis, minor axis, azimuth, and eccentricity for all polygons at once
+    maj_axis, min_axis, ecc, bearing, thinness, dd_ratio = polygon_metrics(hull, area, perimeter, depth)
+    description = shape_descriptor(thinness, dd_ratio)
+
+    # Write calculated fields back to polygons in a single join on OID
+    # ExtendTable creates the fields, so drop any left over from the input (e.g. AREA_M)
+    metrics = np.zeros(len(oids), dtype=[("POLY_OID", "i4"), ("DEP_ID", "i4"), ("AREA_M", "f4"),
+                                         ("PERIMETER", "f4"), ("MAJ_AXIS", "f4"), ("MIN_AXIS", "f4"), ("ECC", "f4"),
+                                         ("AZIMUTH", "f4"), ("THIN_RAT", "f4"), ("MORP_CHAR", "U80"),
+                                         ("DIDP_RAT", "f4")])
+    metrics["POLY_OID"] = oids
+    metrics["DEP_ID"] = np.arange(1, len(oids) + 1)
+    metrics["AREA_M"] = area
+    metrics["PERIMETER"] = perimeter
+    metrics["MAJ_AXIS"] = maj_axis
+    metrics["MIN_AXIS"] = min_axis
+    metrics["ECC"] = ecc
+    metrics["AZIMUTH"] = bearing
+    metrics["THIN_RAT"] = thinness
+    metrics["MORP_CHAR"] = np.array(shape_descriptions)[description]
+    metrics["DIDP_RAT"] = dd_ratio
+
+    existing_fields = [field.name.upper() for field in arcpy.ListFields(depression_polygons)]
+    drop_fields = [name for name in metrics.dtype.names[1:] if name in existing_fields]
+    if drop_fields:
+        arcpy.DeleteField_management(depression_polygons, drop_fields)
+    arcpy.da.ExtendTable(depression_polygons, "OID@", metrics, "POLY_OID")
+
     arcpy.AddMessage("Area, perimeter, major axis, minor axis, eccentricity, azimuth, diamater/depth ratio"
                      "and thinness ratio calculated.")
 
@@ -192,11 +207,26 @@ try:
     # Create field mapping for depression polygons
     fields = ["POCK_DEP", "DEP_ID", "MAJ_AXIS", "MIN_AXIS", "ECC", "AZIMUTH", "THIN_RAT", "AREA_M", "PERIMETER",
               "MORP_CHAR"]
-    field_maps = [arcpy.FieldMap() for i in range(10)]
     field_mappings = arcpy.FieldMappings()
-    for fm, f in zip(field_maps, fields):
-        fm.addInputField(depression_polygons, f)
-        field_mappings.addFieldMap(fm)
+    field_mappings.addTable(depression_polygons)
+    for field in field_mappings.fields:
+        if field.name not in fields:
+            field_mappings.removeFieldMap(field_mappings.findFieldMapIndex(field.name))
+    # Keep the deepest point's own depth value
+    depth_field_map = arcpy.FieldMap()
+    depth_field_map.addInputField(deepest_point, "DEPTH")
+    field_mappings.addFieldMap(depth_field_map)
+
+    # Path variables
+    # Check if workspace is folder and add shapefile extension
+    polygon_path = os.path.join(output, "Depression_Polygons")
+    deepest_point_path = os.path.join(output, "Depression_Deepest_Point")
+    centroid_point_path = os.path.join(output, "Depression_Centroid")
+    paths = [polygon_path, deepest_point_path, centroid_point_path]
+    desc = arcpy.Describe(output)
+    if desc.workspaceType == "FileSystem":
+        paths = [path + ".shp" for path in paths]
+        polygon_path, deepest_point_path, centroid_point_path = paths
 
     # Join depression polygons attributes to deepest point
     deepest_point = arcpy.SpatialJoin_analysis(deepest_point, depression_polygons, None, field_mapping=field_mappings)
@@ -204,25 +234,29 @@ try:
 
     # Clean Up. Delete unwanted fields and remove duplicate deepest points
     # --------------
-    arcpy.DeleteField_management(depression_polygons, ["TARGET_FID", "Join_Count"])
+    polygon_fields = [field.name.upper() for field in arcpy.ListFields(depression_polygons)]
+    join_fields = [name for name in ["TARGET_FID", "Join_Count"] if name.upper() in polygon_fields]
+    if join_fields:
+        arcpy.DeleteField_management(depression_polygons, join_fields)
     arcpy.DeleteField_management(deepest_point, ["TARGET_FID", "Join_Count"])
-    arcpy.DeleteIdentical_management(deepest_point, ["DEP_ID"])
+    deepest_ids = arcpy.da.FeatureClassToNumPyArray(deepest_point, ["OID@", "DEP_ID"], null_value=-1)
+    first_index = np.unique(deepest_ids["DEP_ID"], return_index=True)[1]
+    duplicate_oids = set(np.setdiff1d(deepest_ids["OID@"], deepest_ids["OID@"][first_index]).tolist())
+    if duplicate_oids:
+        with arcpy.da.UpdateCursor(deepest_point, ["OID@"]) as cursor:
+            for row in cursor:
+                if row[0] in duplicate_oids:
+                    cursor.deleteRow()
+            del cursor
     # ---------------
 
-    # Create depression polygon centre point
-    centroid_point = arcpy.FeatureToPoint_management(depression_polygons, None, "INSIDE")
-    arcpy.AddMessage("Centroid point created.")
-
-    # Path variables
-    polygon_path = os.path.join(output, "Depression_Polygons")
-    deepest_point_path = os.path.join(output, "Depression_Deepest_Point")
-    centroid_point_path = os.path.join(output, "Depression_Centroid")
-    paths = [polygon_path, deepest_point_path, centroid_point_path]
-
     # Save output features
     arcpy.CopyFeatures_management(depression_polygons, polygon_path)
     arcpy.CopyFeatures_management(deepest_point, deepest_point_path)
-    arcpy.CopyFeatures_management(centroid_point, centroid_point_path)
+
+    # Create depression polygon centre point straight into the output workspace
+    arcpy.FeatureToPoint_management(depression_polygons, centroid_point_path, "INSIDE")
+    arcpy.AddMessage("Centroid point created.")
 
     # --------------------------------------
     # Optional Symbology, comment out if not needed
@@ -238,11 +272,6 @@ try:
         centroid_point_symbol = os.path.join(file_dir, "centroid.lyr")
         symbols = [polygon_symbol, deepest_point_symbol, centroid_point_symbol]
 
-        # Check if workspace is folder and add shapefile extension
-        desc = arcpy.Describe(output)
-        if desc.workspaceType == "FileSystem":
-            paths = [path + ".shp" for path in paths]
-
         for path, symbol in zip(paths, symbols):
             layer = arcpy.mapping.Layer(path)
             arcpy.ApplySymbologyFromLayer_management(layer, symbol)
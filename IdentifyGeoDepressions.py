@@ -13,7 +13,6 @@ try:
     import arcpy
     import sys
     import traceback
-    import math
     import os
 
     # Custom exceptions for spatial analysis license and bath with negative values only
@@ -34,8 +33,7 @@ try:
         raster -- Depression raster
         """
 
-        minimum = arcpy.GetRasterProperties_management(raster, "MINIMUM")
-        minimum = float(minimum.getOutput(0))
+        minimum = float(raster.minimum)
         remap_range = arcpy.sa.RemapRange([[minimum, -1, 1]])
         return remap_range
 
@@ -55,6 +53,13 @@ try:
     describe = arcpy.Describe(raster_layer)
     raster_source = os.path.join(describe.path, os.path.basename(raster_layer))
     bathy_dataset = arcpy.Raster(raster_source)
+    cell_size = bathy_dataset.meanCellWidth
+    # Area parameters are in square metres, projected spatial reference units are converted with this factor
+    spatial_reference = bathy_dataset.spatialReference
+    if spatial_reference.type == "Projected":
+        square_metres_per_unit = spatial_reference.metersPerUnit ** 2
+    else:
+        square_metres_per_unit = None
     maximum_value = bathy_dataset.maximum
     arcpy.AddMessage("Bathy statistics calculated.")
     if float(maximum_value) > 0:
@@ -76,16 +81,47 @@ try:
     remap = remap_range_creator(depression)
     reclassify_raster = arcpy.sa.Reclassify(depression, "VALUE", remap, "NODATA")
     arcpy.AddMessage("Raster reclassified.")
-    depression_polygons = arcpy.RasterToPolygon_conversion(reclassify_raster, None, "NO_SIMPLIFY", "VALUE")
+
+    # Mask depression regions that are too small and too big before creating polygons
+    # FOUR connectivity matches the polygons created by RasterToPolygon
+    # Minimum area is 3x3 cells
+    min_cells = 9
+    min_area = min_cells * (cell_size ** 2)
+    if square_metres_per_unit:
+        cell_area = (cell_size ** 2) * square_metres_per_unit
+        min_area = min_cells * cell_area
+        regions = arcpy.sa.RegionGroup(reclassify_raster, "FOUR", "WITHIN", "NO_LINK")
+        size_clause = "COUNT >= {} AND COUNT <= {}".format(min_cells, max_area / cell_area)
+
+        # Raise error if there are no depression regions remaining
+        with arcpy.da.SearchCursor(regions, ["VALUE"], size_clause) as cursor:
+            region_count = len(list(cursor))
+            del cursor
+        if region_count < 1:
+            # Raise custom error
+            raise NoFeatures
+
+        size_mask = arcpy.sa.Con(regions, 1, "", size_clause)
+        arcpy.AddMessage("Depression regions out of size range masked.")
+    else:
+        # Geographic bathy cells have no fixed area in square metres, polygons are filtered by AREA_M only
+        size_mask = reclassify_raster
+
+    depression_polygons = arcpy.RasterToPolygon_conversion(size_mask, None, "NO_SIMPLIFY", "VALUE")
     feature_count = arcpy.GetCount_management(depression_polygons)
     arcpy.AddMessage("{} depression polygons created.".format(feature_count))
 
     # Remove polygons that are too small and too big
-    describe = arcpy.Describe(bathy_dataset)
-    cell_size = describe.meanCellWidth
-    min_area = (cell_size * 3) ** 2
     arcpy.AddField_management(depression_polygons, "AREA_M", "FLOAT")
-    arcpy.CalculateField_management(depression_polygons, "AREA_M", "!SHAPE.area@SQUAREMETERS!", "PYTHON")
+    if square_metres_per_unit:
+        with arcpy.da.UpdateCursor(depression_polygons, ["SHAPE@AREA", "AREA_M"]) as cursor:
+            for row in cursor:
+                row[1] = row[0] * square_metres_per_unit
+                cursor.updateRow(row)
+            del cursor
+    else:
+        # Geographic bathy, let the geoprocessor convert to square metres
+        arcpy.CalculateField_management(depression_polygons, "AREA_M", "!SHAPE.area@SQUAREMETERS!", "PYTHON")
     sql_exp = "AREA_M >= {} AND AREA_M <= {}".format(min_area, max_area)
     depression_polygons = arcpy.MakeFeatureLayer_management(depression_polygons, None, sql_exp)
     feature_count = arcpy.GetCount_management(depression_polygons)
@@ -96,26 +132,19 @@ try:
         # Raise custom error
         raise NoFeatures
 
-    # Find pockmark depth and convert to points ready for spatial join
-    zonal_stats = arcpy.sa.ZonalStatistics(depression_polygons, "Id", depression, statistics_type="MINIMUM",
-                                           ignore_nodata="DATA")
-    zonal_points = arcpy.RasterToPoint_conversion(zonal_stats, None, "VALUE")
-
-    # Field mappings for spatial join
-    field_map = arcpy.FieldMap()
-    field_mappings = arcpy.FieldMappings()
-
-    field_map.addInputField(zonal_points, "GRID_CODE")
-    field_map_out = field_map.outputField
-    field_map_out.name = "POCK_DEP"
-    field_map_out.aliasName = "POCK_DEP"
-    field_map.outputField = field_map_out
-    field_map.mergeRule = "MINIMUM"  # Minimum depth == deepest point
-
-    field_mappings.addFieldMap(field_map)
-
-    depression_polygons = arcpy.SpatialJoin_analysis(depression_polygons, zonal_points, None,
-                                                     field_mapping=field_mappings)
+    # Find pockmark depth with a per-polygon zonal statistics table
+    zonal_table = arcpy.sa.ZonalStatisticsAsTable(depression_polygons, "Id", depression, r"in_memory\zonal_table",
+                                                  "DATA", "MINIMUM")
+    with arcpy.da.SearchCursor(zonal_table, ["Id", "MIN"]) as cursor:
+        zonal_min = dict(cursor)
+        del cursor
+
+    arcpy.AddField_management(depression_polygons, "POCK_DEP", "DOUBLE")
+    with arcpy.da.UpdateCursor(depression_polygons, ["Id", "POCK_DEP"]) as cursor:
+        for row in cursor:
+            row[1] = zonal_min.get(row[0])  # Minimum depth == deepest point
+            cursor.updateRow(row)
+        del cursor
     arcpy.AddMessage("GeoDepression depth calculated.")
 
     # Save output features